@@ -2,18 +2,87 @@
 This is Add-On allows users to use Google Cloud Vision API to OCR a document. 
 """
 
+import hashlib
+import io
+import logging
 import os
+import re
 import sys
 import math
-import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import NamedTemporaryFile
 
 # pylint: disable = import-error
+import google.auth
+import numpy as np
+import orjson
 from documentcloud.addon import AddOn
+from documentcloud.toolbelt import requests_retry_session
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
 
 # pylint: disable = no-name-in-module
+from google.api_core.exceptions import (
+    DeadlineExceeded,
+    NotFound,
+    ServiceUnavailable,
+    TooManyRequests,
+)
+from google.api_core.retry import Retry, if_exception_type
 from google.cloud import vision
 from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+
+# Vision names its response files <prefix>output-<start>-to-<end>.json.
+# The match is anchored to the end, as the prefix may contain the same pattern.
+OUTPUT_PAGES_RE = re.compile(r"output-(\d+)-to-(\d+)\.json$")
+
+
+def _extract_positions(annotation):
+    """Extracts the text and normalized bounding box of each word in the annotation"""
+    # Gather the coordinates of every word in one walk, so that the bounds
+    # checks can run over all of them at once
+    words = []
+    coordinates = []
+    words_append = words.append
+    coordinates_append = coordinates.append
+    for ann_page in annotation["pages"]:
+        for block in ann_page["blocks"]:
+            for paragraph in block["paragraphs"]:
+                for word in paragraph["words"]:
+                    # The top left, top right and bottom right corners
+                    v0, v1, v2, _ = word["boundingBox"]["normalizedVertices"]
+                    coordinates_append(
+                        (
+                            v0.get("x") or 0.0,  # Leftmost x-coordinate
+                            v1.get("x") or 0.0,  # Rightmost x-coordinate
+                            v0.get("y") or 0.0,  # Topmost y-coordinate
+                            v2.get("y") or 0.0,  # Bottommost y-coordinate
+                        )
+                    )
+                    words_append(word)
+    if not words:
+        return []
+
+    # Keep the words whose bounding box lies within the page.
+    # Their text is interned, so that repeated words share a single string.
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    in_page = ((coordinates >= 0.0) & (coordinates <= 1.0)).all(axis=1)
+    intern = sys.intern
+    return [
+        {
+            "text": intern("".join(symbol["text"] for symbol in words[i]["symbols"])),
+            "x1": x1,
+            "x2": x2,
+            "y1": y1,
+            "y2": y2,
+        }
+        for i, (x1, x2, y1, y2) in zip(
+            np.flatnonzero(in_page).tolist(), coordinates[in_page].tolist()
+        )
+    ]
 
 
 class CloudVision(AddOn):
@@ -26,16 +95,49 @@ class CloudVision(AddOn):
         self.setup_credential_file()
         # Set bucket name
         self.bucket_name = "documentcloud_cloudvision_ocr"
+        # The number of documents processed concurrently
+        self.max_workers = 8
+        # The number of response files downloaded concurrently for a document
+        self.download_workers = 8
+        # Enough pooled storage connections for every concurrent download,
+        # so that none of them have to be discarded and set up again
+        self.storage_pool_size = self.max_workers * self.download_workers
         # Instantiate a client for the client libraries 'storage' and 'vision'
-        self.storage_client = storage.Client()
+        self.storage_client = self.setup_storage_client()
         self.vision_client = vision.ImageAnnotatorClient()
         self.bucket = self.storage_client.get_bucket(self.bucket_name)
         # Activate DOCUMENT_TEXT_DETECTION feature
         self.feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+        self.features = [self.feature]
+        # The folder in the bucket which the PDFs and responses are uploaded to
+        self.remote_dir = "out"
+        # Keeps this run's uploads and responses apart from any other run's
+        self.run_id = uuid.uuid4().hex
         # Set file format to PDF
         self.mime_type = "application/pdf"
         # The number of pages that will be grouped in each json response file
-        self.batch_size = 1
+        self.batch_size = 20
+        # The titles of the documents whose OCR results could not be fully set,
+        # by document ID
+        self.failed_documents = {}
+        # The number of documents sent to Vision in a single operation
+        self.files_per_request = 8
+        # Retry Vision calls which fail on quota or availability errors,
+        # doubling the wait between attempts
+        self.vision_retry = Retry(
+            predicate=if_exception_type(
+                TooManyRequests, ServiceUnavailable, DeadlineExceeded
+            ),
+            initial=1.0,
+            maximum=60.0,
+            multiplier=2.0,
+            timeout=300.0,
+        )
+        # Storage calls keep the library's default retry, which also covers
+        # server errors and dropped connections
+        self.storage_retry = DEFAULT_RETRY
+        # Bounds the number of Vision operations in flight across all workers
+        self.vision_semaphore = threading.BoundedSemaphore(4)
 
     def setup_credential_file(self):
         """Sets up Google Cloud credential file"""
@@ -47,8 +149,20 @@ class CloudVision(AddOn):
             gac_name = gac.name
         os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gac_name
 
-    def validate(self):
-        """Validate that we can run the OCR"""
+    def setup_storage_client(self):
+        """Sets up a storage client whose HTTP session keeps a pool of
+        connections open, so that concurrent blob operations reuse them"""
+        credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+        session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(
+            pool_connections=self.storage_pool_size,
+            pool_maxsize=self.storage_pool_size,
+        )
+        session.mount("https://", adapter)
+        return storage.Client(project=project, credentials=credentials, _http=session)
+
+    def validate(self, documents):
+        """Validate that we can run the OCR on the given documents"""
         if self.get_document_count() is None:
             self.set_message(
                 "It looks like no documents were selected. Search for some or "
@@ -59,65 +173,114 @@ class CloudVision(AddOn):
             self.set_message("No organization to charge.")
             return False
         else:
-            num_pages = 0
-            for document in self.get_documents():
-                num_pages += document.page_count
+            num_pages = sum(document.page_count for document in documents)
             try:
                 self.charge_credits(num_pages)
             except ValueError:
                 return False
         return True
 
-    def json_ocr(self, input_dir, filename):
-        """Uploads the PDFs to storage, runs OCR on the documents,
-        and collects the gcs location for the repsonses"""
+    def build_async_request(self, pdf_file, document_id):
+        """Uploads the PDF to storage and builds its OCR request,
+        along with the uploaded blob and the gcs location for the responses"""
         # Create a remote path.
-        # The combination of os.path.basename and os.path.normath
-        # extracts the name of the last directory of the path, i.e. 'docs_to_OCR'.
-        remote_subdir = os.path.basename(os.path.normpath(input_dir))
-        rel_remote_path = os.path.join(remote_subdir, filename)
+        # Remote names are keyed on the run and the document ID rather than its
+        # title, as titles are not unique and documents are processed
+        # concurrently, and so that other runs on the same document, or
+        # responses left behind by a failed run, are never picked up.
+        rel_remote_path = f"{self.remote_dir}/{self.run_id}/{document_id}.pdf"
 
         # Upload file to Google Cloud Bucket as a blob.
         blob = self.bucket.blob(rel_remote_path)
-        blob.upload_from_filename(os.path.join(input_dir, filename))
+        blob.upload_from_file(
+            pdf_file,
+            content_type=self.mime_type,
+            size=pdf_file.tell(),
+            rewind=True,
+            retry=self.storage_retry,
+        )
 
         # Remote path to the file.
-        gcs_source_uri = os.path.join("gs://", self.bucket_name, rel_remote_path)
-
-        # Input source and input configuration.
-        gcs_source = vision.GcsSource(uri=gcs_source_uri)
-        input_config = vision.InputConfig(
-            gcs_source=gcs_source, mime_type=self.mime_type
-        )
+        # gs:// URIs are built with f-strings, as os.path.join is slower
+        # and is not meant for URIs.
+        gcs_source_uri = f"gs://{self.bucket_name}/{rel_remote_path}"
 
         # Path to the response JSON files in the Google Cloud Storage.
-        # In this case, the JSON files will be saved inside a
-        # subfolder of the Cloud version of the input_dir called 'json_output'.
-        gcs_destination_uri = os.path.join(
-            "gs://", self.bucket_name, remote_subdir, "json_output", filename[:60] + "_"
-        )
-
-        # Output destination and output configuration.
-        gcs_destination = vision.GcsDestination(uri=gcs_destination_uri)
-        output_config = vision.OutputConfig(
-            gcs_destination=gcs_destination, batch_size=self.batch_size
+        # In this case, the JSON files will be saved inside a folder per
+        # run and document, in a subfolder of the remote directory called
+        # 'json_output'.
+        gcs_destination_uri = (
+            f"gs://{self.bucket_name}/{self.remote_dir}/json_output/"
+            f"{self.run_id}/{document_id}/"
         )
 
-        # Instantiate OCR annotation request.
+        # Instantiate OCR annotation request, with its input source and output
+        # destination. The feature list is shared between requests.
         async_request = vision.AsyncAnnotateFileRequest(
-            features=[self.feature],
-            input_config=input_config,
-            output_config=output_config,
+            features=self.features,
+            input_config=vision.InputConfig(
+                gcs_source=vision.GcsSource(uri=gcs_source_uri),
+                mime_type=self.mime_type,
+            ),
+            output_config=vision.OutputConfig(
+                gcs_destination=vision.GcsDestination(uri=gcs_destination_uri),
+                batch_size=self.batch_size,
+            ),
         )
 
+        return async_request, blob, gcs_destination_uri
+
+    def prepare_ocr(self, document):
+        """Sets the document's text from the cache if it has been OCR'd before,
+        otherwise uploads its PDF and returns its job and OCR request"""
+        try:
+            pdf_file, pdf_hash = self.download_pdf(document)
+            with pdf_file:
+                # Documents which have been OCR'd before are set from the cache
+                # without being sent to Vision again
+                cache_blob = self.cache_blob(pdf_hash)
+                cached_pages = self.read_cache(cache_blob)
+                if cached_pages is not None:
+                    self.set_pages(document, cached_pages)
+                    return None
+                (
+                    async_request,
+                    pdf_blob,
+                    gcs_destination_uri,
+                ) = self.build_async_request(pdf_file, document.id)
+        except Exception:  # pylint: disable = broad-except
+            logging.exception("Could not prepare document %s", document.id)
+            self.fail_document(document)
+            return None
+        return (document, pdf_blob, cache_blob), async_request, gcs_destination_uri
+
+    def submit_ocr(self, prepared):
+        """Starts OCR on a group of prepared documents in a single Vision
+        operation, without waiting for it to complete"""
+        jobs = [job for job, _, _ in prepared]
+        async_requests = [async_request for _, async_request, _ in prepared]
+        gcs_destination_uris = [uri for _, _, uri in prepared]
+        # Held until vision_method has collected the operation, which may be
+        # on another thread, to bound the number of operations in flight
+        self.vision_semaphore.acquire()
+        try:
+            operation = self.vision_client.async_batch_annotate_files(
+                requests=async_requests, retry=self.vision_retry
+            )
+        except Exception:  # pylint: disable = broad-except
+            self.vision_semaphore.release()
+            logging.exception("Could not start OCR on %d documents", len(jobs))
+            for document, _, _ in jobs:
+                self.fail_document(document)
+            return [], None, []
+
+        return jobs, operation, gcs_destination_uris
+
+    def collect_ocr(self, operation, num_files):
+        """Waits for a Vision operation started by submit_ocr to complete"""
         # The timeout variable tells you when a process takes too long and should be aborted.
         # If the OCR process fails due to timeout, you can try and increase this threshold.
-        operation = self.vision_client.async_batch_annotate_files(
-            requests=[async_request]
-        )
-        operation.result(timeout=360)
-
-        return gcs_destination_uri
+        operation.result(timeout=360 * num_files, retry=self.vision_retry)
 
     def list_blobs(self, gcs_destination_uri):
         """Identifies the responsible blobs and orders them"""
@@ -126,101 +289,261 @@ class CloudVision(AddOn):
 
         # Use this prefix to extract the correct JSON response
         # files from your bucket and store them as 'blobs' in a list.
-        blobs_list = list(self.bucket.list_blobs(prefix=prefix))
+        blobs_list = list(
+            self.bucket.list_blobs(prefix=prefix, retry=self.storage_retry)
+        )
 
-        # Order the list by length before sorting it alphabetically,
+        # Order the list by the first page number of each response file,
         # so that the text appears in the correct order in the output file
-        blobs_list = sorted(blobs_list, key=lambda blob: len(blob.name))
+        blobs_list = sorted(
+            blobs_list,
+            key=lambda blob: int(OUTPUT_PAGES_RE.search(blob.name).group(1)),
+        )
 
         return blobs_list
 
     def set_doc_text(self, document, blobs_list):
-        """Uses DC API to set the page text and positions given the OCR resp"""
+        """Uses DC API to set the page text and positions given the OCR resp.
+        Pages which cannot be read are skipped, and the document is recorded as
+        failed. Returns the pages set, and whether every page could be read."""
         pages = []
-        for i, blob in enumerate(blobs_list):
-            json_string = blob.download_as_string()
-            response = json.loads(json_string)
-            full_text_response = response["responses"]
+        failed = False
+        # Download the response files concurrently, keeping them in page order
+        with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+            raw_responses = list(
+                executor.map(
+                    lambda blob: blob.download_as_bytes(retry=self.storage_retry),
+                    blobs_list,
+                )
+            )
+        for blob, json_bytes in zip(blobs_list, raw_responses):
+            # Each file holds consecutive pages starting at the one in its name.
+            # Vision numbers pages from 1, while DocumentCloud numbers them from 0.
+            first_page = int(OUTPUT_PAGES_RE.search(blob.name).group(1)) - 1
+            # orjson parses straight from the downloaded bytes
+            try:
+                full_text_response = orjson.loads(json_bytes)["responses"]
+            except (KeyError, ValueError):
+                logging.exception(
+                    "Could not parse %s for document %s", blob.name, document.id
+                )
+                failed = True
+                continue
 
-            for text_response in full_text_response:
+            for j, text_response in enumerate(full_text_response):
                 try:
-                    annotation = text_response.get("fullTextAnnotation")
-                    if annotation:
-                        page = {
-                            "page_number": i,
-                            "text": annotation["text"],
-                            "ocr": "googlecv",
-                            "positions": [],  # Initialize positions array
-                        }
-
-                        # Extract text position information for words
-                        for ann_page in annotation["pages"]:
-                            for block in ann_page["blocks"]:
-                                for paragraph in block["paragraphs"]:
-                                    for word in paragraph["words"]:
-                                        normalized_vertices = word["boundingBox"][
-                                            "normalizedVertices"
-                                        ]
-                                        x1 = normalized_vertices[0].get("x", 0)  # Leftmost x-coordinate
-                                        x2 = normalized_vertices[1].get("x", 0)  # Rightmost x-coordinate
-                                        y1 = normalized_vertices[0].get("y", 0)  # Topmost y-coordinate
-                                        y2 = normalized_vertices[2].get("y", 0)  # Bottommost y-coordinate
-
-                                        symbols_list = word["symbols"]
-                                        full_text = ''.join(symbol["text"] for symbol in symbols_list)
-                                        if 0 <= x1 <= 1 and 0 <= x2 <= 1 and 0 <= y1 <= 1 and 0 <= y2 <= 1:
-                                            position_info = {
-                                                "text": full_text,
-                                                "x1": x1,
-                                                "x2": x2,
-                                                "y1": y1,
-                                                "y2": y2,
-                                            }
-                                            # Append position information to the page dictionary
-                                            page["positions"].append(position_info)
-
-                        pages.append(page)
-                    else:
-                        page = {
-                            "page_number": i,
-                            "text": "",
-                            "ocr": "googlecv",
-                            "positions": [],  # Initialize positions array
-                        }
-                        pages.append(page)
-                except KeyError as e:
-                    print(e)
-                    self.set_message("Key error- ping us at info@documentcloud.org with the document you're trying to OCR")
-                    sys.exit(1)
-                except ValueError as v:
-                    self.set_message(
-                        "Value error - Ping us at info@documentcloud.org"
-                        " if you see this more than once."
+                    pages.append(self.build_page(first_page + j, text_response))
+                except (KeyError, ValueError):
+                    logging.exception(
+                        "Could not read page %d of document %s",
+                        first_page + j,
+                        document.id,
                     )
-                    sys.exit(1)
+                    failed = True
+
+        if not pages:
+            failed = True
+            self.set_message(
+                f"Could not read the OCR results for {document.title} - Ping us at "
+                "info@documentcloud.org if you see this more than once."
+            )
+        if failed:
+            self.fail_document(document)
+        if pages:
+            self.set_pages(document, pages)
+        return pages, not failed
+
+    def build_page(self, page_number, text_response):
+        """Builds a page with its text and positions from a page's OCR response"""
+        annotation = text_response.get("fullTextAnnotation")
+        if annotation:
+            return {
+                "page_number": page_number,
+                "text": annotation["text"],
+                "ocr": "googlecv",
+                # Extract text position information for words
+                "positions": _extract_positions(annotation),
+            }
+        return {
+            "page_number": page_number,
+            "text": "",
+            "ocr": "googlecv",
+            "positions": [],
+        }
+
+    def set_pages(self, document, pages):
+        """Sets the pages with text and position information to the document"""
+        # All pages go in a single request, as each request starts a processing
+        # job on the document. The client raises an APIError if it fails.
+        self.client.patch(
+            f"documents/{document.id}/",
+            data=orjson.dumps({"pages": pages}),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def download_pdf(self, document):
+        """Streams the document's PDF into an in-memory file in chunks,
+        returning it along with the SHA-256 hash of its contents"""
+        pdf_file = io.BytesIO()
+        pdf_hash = hashlib.sha256()
+        # Mirrors python-documentcloud's own PDF getter: public assets are
+        # fetched without the add-on's credentials, while private ones need
+        # the authenticated session
+        if document.access == "public":
+            response = requests_retry_session().get(
+                document.pdf_url,
+                headers={"User-Agent": "python-documentcloud2"},
+                stream=True,
+                timeout=self.client.timeout,
+            )
+        else:
+            response = self.client.get(document.pdf_url, full_url=True, stream=True)
+        with response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                pdf_hash.update(chunk)
+                pdf_file.write(chunk)
+        return pdf_file, pdf_hash.hexdigest()
+
+    def cache_blob(self, pdf_hash):
+        """Returns the blob which caches the OCR results for the given PDF hash"""
+        # The OCR feature and file format are part of the key, so that
+        # changing either does not serve results made with the old settings
+        key = f"{pdf_hash}|{self.feature.type_.name}|pdf"
+        key_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.bucket.blob(f"cache/{key_hash}.pages.json")
+
+    def read_cache(self, cache_blob):
+        """Returns the pages cached in the given blob, or None if there are none
+        or they cannot be read, in which case the document is OCR'd again"""
+        try:
+            cached_pages = orjson.loads(
+                cache_blob.download_as_bytes(retry=self.storage_retry)
+            )
+        except NotFound:
+            return None
+        except ValueError:
+            logging.exception("Could not read cached pages from %s", cache_blob.name)
+            return None
+        if not isinstance(cached_pages, list):
+            logging.error("Unexpected cached pages in %s", cache_blob.name)
+            return None
+        return cached_pages
 
-        # Set the pages with text and position information to the document
-        resp = self.client.patch(f"documents/{document.id}/", json={"pages": pages})
+    def fail_document(self, document):
+        """Records that the document's OCR results could not be fully set"""
+        # Keyed on the ID, so a document is only reported once
+        self.failed_documents[document.id] = document.title
 
-    def vision_method(self, document, input_dir, filename):
-        """Main method that calls the sub-methods to perform OCR on a doc"""
-        # Assign the remote path to the response JSON files to a variable.
-        gcs_destination_uri = self.json_ocr(input_dir, filename)
-        # Create an ordered list of blobs from these remote JSON files.
-        blobs_list = self.list_blobs(gcs_destination_uri)
-        self.set_doc_text(document, blobs_list)
+    def vision_method(self, executor, jobs, operation, gcs_destination_uris):
+        """Main method that waits for a Vision operation to complete, then sets
+        the OCR text on each of its docs as a separate task on the executor.
+        Returns the futures for those tasks."""
+        try:
+            self.collect_ocr(operation, len(jobs))
+        except Exception:  # pylint: disable = broad-except
+            logging.exception("OCR failed on %d documents", len(jobs))
+            for document, _, _ in jobs:
+                self.fail_document(document)
+            return []
+        finally:
+            # Acquired by submit_ocr when the operation was started
+            self.vision_semaphore.release()
+        return [
+            executor.submit(self.set_job_text, job, gcs_destination_uri)
+            for job, gcs_destination_uri in zip(jobs, gcs_destination_uris)
+        ]
+
+    def set_job_text(self, job, gcs_destination_uri):
+        """Sets the OCR text on a document, caches it and cleans up storage.
+        Failures are isolated to the document, so they do not lose the others."""
+        document, pdf_blob, cache_blob = job
+        try:
+            # Create an ordered list of blobs from these remote JSON files.
+            blobs_list = self.list_blobs(gcs_destination_uri)
+            pages, complete = self.set_doc_text(document, blobs_list)
+        except Exception:  # pylint: disable = broad-except
+            logging.exception("Could not set the text of document %s", document.id)
+            self.fail_document(document)
+            return
+        if not complete:
+            # Partial results are not cached, and the responses are kept
+            # in storage to look into what went wrong
+            return
+
+        # The text is set by now, so the steps below only log their failures
+        try:
+            cache_blob.upload_from_string(
+                orjson.dumps(pages),
+                content_type="application/json",
+                retry=self.storage_retry,
+            )
+        except Exception:  # pylint: disable = broad-except
+            logging.exception("Could not cache the pages of document %s", document.id)
+        # The uploaded PDF and its responses are no longer needed once the
+        # text is set, and leaving them would slow down later blob listings
+        try:
+            self.bucket.delete_blobs(
+                blobs_list + [pdf_blob],
+                on_error=lambda blob: None,
+                retry=self.storage_retry,
+            )
+        except Exception:  # pylint: disable = broad-except
+            logging.exception("Could not clean up storage for document %s", document.id)
 
     def main(self):
         """For each document, it sends the PDF to Google Cloud Storage and runs OCR"""
-        os.mkdir("out")
-        if not self.validate():
+        # Fetch the documents once, longest first, so that the workers start
+        # preparing the slowest documents first
+        documents = sorted(
+            self.get_documents(), key=lambda document: document.page_count, reverse=True
+        )
+        if not self.validate(documents):
             # if not validated, return immediately
             return
-        for document in self.get_documents():
-            pdf_name = f"{document.title}.pdf"
-            with open(f"./out/{document.title}.pdf", "wb") as file:
-                file.write(document.pdf)
-            self.vision_method(document, "out", pdf_name)
+        # The pipeline is network bound, so overlap the Google Cloud round-trips.
+        # The storage and vision clients are shared, as both are thread-safe.
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # Download, check the cache for and upload each document as its
+                # own task, dropping those which were cached or failed
+                prepared = [
+                    job
+                    for job in executor.map(self.prepare_ocr, documents)
+                    if job is not None
+                ]
+                # Deal the documents out round-robin, so that the longest ones
+                # are spread across the Vision operations instead of sharing one
+                num_groups = math.ceil(len(prepared) / self.files_per_request)
+                groups = [prepared[i::num_groups] for i in range(num_groups)]
+                # Start each group's Vision operation as soon as it is ready,
+                # with a task waiting on it, so that the operations are processed
+                # concurrently server-side. Each of these tasks then sets the
+                # text of its documents as separate tasks.
+                collections = []
+                for group in groups:
+                    jobs, operation, gcs_destination_uris = self.submit_ocr(group)
+                    if jobs:
+                        collections.append(
+                            executor.submit(
+                                self.vision_method,
+                                executor,
+                                jobs,
+                                operation,
+                                gcs_destination_uris,
+                            )
+                        )
+                for collection in collections:
+                    for future in collection.result():
+                        future.result()
+        finally:
+            # Report the failures even if the run itself was cut short
+            if self.failed_documents:
+                titles = ", ".join(self.failed_documents.values())
+                self.set_message(
+                    f"Could not read all of the OCR results for: {titles} - Ping us "
+                    "at info@documentcloud.org if you see this more than once."
+                )
 
 
 if __name__ == "__main__":